@@ -1,25 +1,32 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Query
+from fastapi import FastAPI, HTTPException, Depends, status, Query, WebSocket, WebSocketDisconnect, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
-from app.services.suggest_service import generate_suggestions
-from app.services.rewrite_service import rewrite_sentence
+from app.services.suggest_service import generate_suggestions, stream_suggestions
+from app.services.rewrite_service import rewrite_sentence, stream_rewrite_sentence
 from app.services.logic_profile_service import (
     analyze_logic_with_profile,
     analyze_logic_breaks,
     generate_tasks_for_profile,
 )
-from app.services.essay_service import get_all_essays, get_essay_by_id
+from app.services.essay_service import get_all_essays, get_all_essays_brief_bytes, get_essay_by_id
 from fastapi.middleware.cors import CORSMiddleware
 from app.models import init_db, get_db, User, UserProfile
 from app.auth import (
     authenticate_user, get_password_hash, create_access_token,
     get_user_by_username, get_current_user
 )
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import timedelta
+import asyncio
 import json
+import logging
+import orjson
 from typing import Optional, Any, List
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
 # 初始化数据库
@@ -97,14 +104,117 @@ def to_user_response(user: User) -> UserResponse:
 
 @app.post("/suggest")
 async def get_suggestions(request: SuggestionRequest):
-    result = generate_suggestions(request.text, request.cursor, request.read_essay_ids)
-    parsed = parse_json_response(result, "suggestions")
-    return {"suggestions": parsed.get("suggestions", [])}
+    result = await generate_suggestions(request.text, request.cursor, request.read_essay_ids)
+    return {"suggestions": result.get("suggestions", [])}
 
 @app.post("/rewrite")
 async def rewrite_sentence_endpoint(request: RewriteRequest):
-    result = rewrite_sentence(request.sentence)
-    return parse_json_response(result)
+    return await rewrite_sentence(request.sentence)
+
+
+# Server-Sent Events：模型边生成边推送，首字节时间不再等于完整生成时间
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _sse_event(payload) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+@app.post("/suggest/stream")
+async def stream_suggestions_endpoint(request: SuggestionRequest):
+    async def events():
+        try:
+            async for suggestion in stream_suggestions(request.text, request.cursor, request.read_essay_ids):
+                yield _sse_event({"suggestion": suggestion})
+        except Exception as e:
+            yield _sse_event({"error": str(e)})
+            return
+        yield _sse_event({"done": True})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/rewrite/stream")
+async def stream_rewrite_endpoint(request: RewriteRequest):
+    async def events():
+        try:
+            async for fragment in stream_rewrite_sentence(request.sentence):
+                yield _sse_event({"delta": fragment})
+        except Exception as e:
+            yield _sse_event({"error": str(e)})
+            return
+        yield _sse_event({"done": True})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# Upper bound on queued suggestion results coalesced into one WebSocket frame
+WS_BATCH_LIMIT = 128
+
+
+async def _ws_suggestions(data: dict) -> list:
+    result = await generate_suggestions(
+        data.get("text", ""),
+        data.get("cursor"),
+        data.get("read_essay_ids"),
+    )
+    return result.get("suggestions", [])
+
+
+async def _ws_batch_writer(ws: WebSocket, queue: asyncio.Queue):
+    """
+    Take every queued generation task, wait for them, and send the surviving
+    results (in message order) as one frame. Superseded tasks were cancelled by the reader.
+    """
+    while True:
+        tasks = [await queue.get()]
+        while len(tasks) < WS_BATCH_LIMIT:
+            try:
+                tasks.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        await asyncio.wait(tasks)
+        batch = [task.result() for task in tasks if not task.cancelled() and task.exception() is None]
+        if batch:
+            await ws.send_text(orjson.dumps({"batch": batch}).decode())
+
+
+@app.websocket("/ws/suggest")
+async def suggest_websocket(ws: WebSocket):
+    """
+    Real-time suggestion endpoint for the editor.
+    Each message starts its own generation task, so the reader keeps receiving while
+    the model runs. A new keystroke cancels the previous task if it has not finished yet;
+    results that are ready together are flushed by the writer task in a single frame.
+    """
+    await ws.accept()
+    queue: asyncio.Queue = asyncio.Queue()
+    writer = asyncio.create_task(_ws_batch_writer(ws, queue))
+    latest: Optional[asyncio.Task] = None
+    try:
+        while True:
+            raw = await ws.receive_text()
+            # Guarded so the slice and formatting are skipped unless debug logging is on
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Received from client: %s", raw[:50])
+            try:
+                data = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                logger.debug("Ignoring non-JSON WebSocket frame")
+                continue
+            if not isinstance(data, dict):
+                logger.debug("Ignoring WebSocket frame that is not a JSON object")
+                continue
+            if latest is not None and not latest.done():
+                latest.cancel()  # superseded by newer text
+            latest = asyncio.create_task(_ws_suggestions(data))
+            await queue.put(latest)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        writer.cancel()
+        if latest is not None:
+            latest.cancel()
 
 @app.post("/analyze-logic")
 async def analyze_logic_endpoint(
@@ -154,7 +264,10 @@ async def get_essays(
     preview_len: int = Query(200, ge=0, le=1000, description="Preview length for brief mode."),
 ):
     """Get all IELTS essays."""
-    essays = get_all_essays(brief=brief, preview_len=preview_len)
+    if brief:
+        # Static corpus: the encoded summary body is cached and sent as-is
+        return Response(content=get_all_essays_brief_bytes(preview_len), media_type="application/json")
+    essays = get_all_essays(preview_len=preview_len)
     return {"essays": essays, "total": len(essays)}
 
 
@@ -267,7 +380,8 @@ async def get_user_profile(
 @app.get("/users")
 async def get_all_users(db: Session = Depends(get_db)):
     """获取所有用户列表（仅用于开发调试）"""
-    users = db.query(User).all()
+    # 只取需要的列，不加载密码哈希，也不构造 User 对象
+    users = db.execute(select(User.id, User.username, User.created_at)).all()
     return {
         "total": len(users),
         "users": [
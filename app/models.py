@@ -16,12 +16,20 @@ DB_USER = os.getenv("DB_USER", "appuser")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "App@12345678")
 DB_NAME = os.getenv("DB_NAME", "appdb")
 
+# 连接池配置：默认池只有 5 个连接，WebSocket 并发下请求会排队等待连接
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
 # MySQL 连接字符串（使用quote_plus编码密码中的特殊字符）
 DATABASE_URL = f"mysql+pymysql://{DB_USER}:{quote_plus(DB_PASSWORD)}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
 
 # 创建数据库引擎
 engine = create_engine(
     DATABASE_URL,
+    pool_size=DB_POOL_SIZE,        # 常驻连接数
+    max_overflow=DB_MAX_OVERFLOW,  # 高峰期允许额外创建的连接数
+    pool_timeout=DB_POOL_TIMEOUT,  # 等待空闲连接的超时时间（秒）
     pool_pre_ping=True,  # 自动重连
     pool_recycle=3600,   # 连接回收时间
     echo=False  # 设置为True可以看到SQL语句
@@ -63,9 +71,16 @@ class UserProfile(Base):
     user = relationship("User", back_populates="profile")
 
 
-# 创建数据库表
+# 创建数据库表（每个进程只执行一次，重复调用不再访问数据库）
+_db_initialized = False
+
+
 def init_db():
+    global _db_initialized
+    if _db_initialized:
+        return
     Base.metadata.create_all(bind=engine)
+    _db_initialized = True
 
 
 # 获取数据库会话
@@ -0,0 +1,106 @@
+# app/services/batch_queue.py
+"""
+Asyncio micro-batching queue.
+Requests arriving within a short window are coalesced and handed to one
+batch handler, so N concurrent callers share a single downstream call.
+Each caller still awaits its own Future and gets back its own result.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 0.03  # 30 ms
+DEFAULT_MAX_BATCH = 8
+
+
+class MicroBatcher:
+    """
+    Collects submitted items for up to `window` seconds (or until `max_batch` items)
+    and processes them with `handler(items) -> results`, where results[i] belongs to items[i].
+    The window only opens when more than one item is queued; a lone item is dispatched at once.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        window: float = DEFAULT_WINDOW,
+        max_batch: int = DEFAULT_MAX_BATCH,
+    ):
+        self._handler = handler
+        self._window = window
+        self._max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Strong references to in-flight dispatch tasks so they cannot be garbage-collected mid-run
+        self._dispatches: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    def _ensure_worker(self):
+        # 队列和后台任务都绑定事件循环，第一次在循环内调用时才创建
+        if self._worker is not None and not self._worker.done():
+            return
+        if self._queue is not None:
+            # The previous worker stopped; callers still waiting in its queue would otherwise hang
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                self._fail(future, RuntimeError("Micro-batch worker stopped"))
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: BaseException):
+        if future.done():
+            return
+        try:
+            future.set_exception(error)
+        except RuntimeError:
+            pass  # its event loop is already closed; nobody can be awaiting it
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                # Let submitters from the same loop iteration enqueue first
+                await asyncio.sleep(0)
+                # A lone request is dispatched at once instead of waiting out the window
+                deadline = loop.time() + self._window if not self._queue.empty() else 0.0
+                while len(batch) < self._max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                # Process in the background so the next window starts collecting immediately
+                task = loop.create_task(self._dispatch(batch))
+                self._dispatches.add(task)
+                task.add_done_callback(self._dispatches.discard)
+                batch = []
+        except asyncio.CancelledError:
+            for _, future in batch:
+                self._fail(future, RuntimeError("Micro-batch worker stopped"))
+            raise
+
+    async def _dispatch(self, batch: list):
+        items = [item for item, _ in batch]
+        try:
+            results = await self._handler(items)
+        except Exception as e:
+            logger.error(f"Batch handler error ({len(items)} items): {e}")
+            for _, future in batch:
+                self._fail(future, e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -1,17 +1,31 @@
+import io
+import os
 import re
+import csv
 import json
+import orjson
 import logging
 import hashlib
+import hmac
 import uuid
 from typing import List, Dict, Optional, Any, Union
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from collections import deque
+
+try:
+    import hyperscan  # Optional: SIMD multi-pattern DFA for value classification
+except ImportError:
+    hyperscan = None
 
 # 配置日志记录器
 logger = logging.getLogger("ComplianceEngine")
 logger.setLevel(logging.INFO)
 
+# 审计完整性密钥：只保存在服务端，不随报告导出；未配置时每个进程随机生成
+AUDIT_HMAC_KEY = os.getenv("AUDIT_HMAC_KEY", "").encode() or os.urandom(32)
+
 class ComplianceStandard(Enum):
     """
     Enumeration of supported compliance standards.
@@ -36,6 +50,11 @@ class PIIFieldConfig:
     masking_strategy: str
     sensitivity: SensitivityLevel
     description: str
+    _compiled_name: "re.Pattern" = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Compiled once per rule; key-name matching no longer goes through re's cache per call
+        self._compiled_name = re.compile(self.field_name, re.IGNORECASE)
 
 class DataAnonymizer:
     """
@@ -56,9 +75,13 @@ class DataAnonymizer:
         "date_iso": re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?$")
     }
 
+    KEY_CACHE_SIZE = 4096  # distinct record keys remembered by _key_rule_position
+
     def __init__(self, standard: ComplianceStandard = ComplianceStandard.GDPR):
         self.standard = standard
         self.salt = uuid.uuid4().hex
+        # Salt is absorbed once; each hash copies this context and only feeds the value bytes
+        self._salt_ctx = hashlib.sha256(self.salt.encode())
         self._initialize_rules()
         logger.info(f"Compliance Engine initialized under standard: {self.standard.value}")
 
@@ -77,48 +100,120 @@ class DataAnonymizer:
             PIIFieldConfig("auth_token", ".*", "redact", SensitivityLevel.CRITICAL, "Bearer token or API key"),
             PIIFieldConfig("session_id", ".*", "hash", SensitivityLevel.INTERNAL, "Temporary session identifier")
         ]
+        self._build_rule_index()
+
+    def _build_rule_index(self):
+        """
+        Precomputes rule lookup tables so a field is classified with one cached key
+        lookup and at most one combined regex match, instead of a sweep over every rule.
+        The first rule (in rule order) whose key name or value pattern matches still wins.
+        """
+        self._rule_positions: Dict[int, int] = {id(rule): i for i, rule in enumerate(self.rules)}
+        # Key name -> position of the first rule whose name regex matches it (None if no rule does)
+        self._key_rule_cache: Dict[str, Optional[int]] = {}
+        self._rules_by_pattern: Dict[str, PIIFieldConfig] = {}
+        for rule in self.rules:
+            if rule.pattern in self.REGEX_PATTERNS:
+                self._rules_by_pattern.setdefault(rule.pattern, rule)
+        # Value patterns can only win over key matches at or after this position
+        self._first_pattern_position = min(
+            (self._rule_positions[id(rule)] for rule in self._rules_by_pattern.values()),
+            default=len(self.rules),
+        )
+
+        # Alternatives keep rule order, so the first rule whose pattern matches still wins
+        self._value_classifier = re.compile("|".join(
+            f"(?P<{name}>{self.REGEX_PATTERNS[name].pattern})" for name in self._rules_by_pattern
+        )) if self._rules_by_pattern else None
+
+        # With hyperscan available, one block scan tests every pattern at once; `re` stays the fallback
+        self._hs_db = None
+        self._hs_names = list(self._rules_by_pattern)
+        if hyperscan is not None and self._hs_names:
+            try:
+                db = hyperscan.Database()
+                db.compile(
+                    expressions=[self.REGEX_PATTERNS[name].pattern.encode() for name in self._hs_names],
+                    ids=list(range(len(self._hs_names))),
+                    elements=len(self._hs_names),
+                    flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(self._hs_names),
+                )
+                self._hs_db = db
+            except hyperscan.error as e:
+                logger.warning(f"Hyperscan compilation failed, using re classifier: {e}")
 
     def process_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
         """
         Recursively processes a dictionary record to sanitize fields.
+        The sanitized record is built in a single pass rather than copied and overwritten.
         """
-        sanitized_record = record.copy()
-        
-        for key, value in record.items():
-            # Recursion for nested objects
-            if isinstance(value, dict):
-                sanitized_record[key] = self.process_record(value)
-                continue
-            
-            if isinstance(value, list):
-                sanitized_record[key] = [
-                    self.process_record(v) if isinstance(v, dict) else v 
-                    for v in value
-                ]
-                continue
-
-            # Check against rules
-            for rule in self.rules:
-                if self._matches_rule(key, value, rule):
-                    sanitized_record[key] = self._apply_mask(value, rule.masking_strategy)
-                    break
-        
-        return sanitized_record
+        return {
+            key: self.process_record(value) if isinstance(value, dict)
+            else [self.process_record(v) if isinstance(v, dict) else v for v in value] if isinstance(value, list)
+            else self._mask_or_pass(key, value)
+            for key, value in record.items()
+        }
 
-    def _matches_rule(self, key: str, value: Any, rule: PIIFieldConfig) -> bool:
+    def _mask_or_pass(self, key: str, value: Any) -> Any:
         """
-        Determines if a field matches a specific PII rule.
+        Masks a scalar field if a PII rule applies to it, otherwise returns it unchanged.
         """
-        # Key name matching
-        if re.search(rule.field_name, key, re.IGNORECASE):
-            return True
-        
+        rule = self._find_rule(key, value)
+        if rule is None:
+            return value
+        return self._apply_mask(value, rule.masking_strategy)
+
+    def _find_rule(self, key: str, value: Any) -> Optional[PIIFieldConfig]:
+        """
+        Resolves the PII rule for a field: the first rule, in rule order, whose
+        name regex matches the key or whose value pattern matches the value.
+        """
+        key_position = self._key_rule_position(key)
+        if key_position is not None and key_position <= self._first_pattern_position:
+            return self.rules[key_position]
+
         # Value pattern matching (expensive operation, strictly controlled)
-        if isinstance(value, str) and rule.pattern in self.REGEX_PATTERNS:
-            if self.REGEX_PATTERNS[rule.pattern].match(value):
-                return True
-        
-        return False
+        value_rule = self._classify_value(value) if isinstance(value, str) else None
+        if value_rule is None:
+            return self.rules[key_position] if key_position is not None else None
+        if key_position is not None and key_position < self._rule_positions[id(value_rule)]:
+            return self.rules[key_position]
+        return value_rule
+
+    def _key_rule_position(self, key: str) -> Optional[int]:
+        """
+        Position of the first rule whose name regex matches the key; record keys repeat, so it is cached.
+        """
+        try:
+            return self._key_rule_cache[key]
+        except KeyError:
+            pass
+        position = next((i for i, rule in enumerate(self.rules) if self._matches_rule(key, rule)), None)
+        if len(self._key_rule_cache) < self.KEY_CACHE_SIZE:
+            self._key_rule_cache[key] = position
+        return position
+
+    def _classify_value(self, value: str) -> Optional[PIIFieldConfig]:
+        """
+        Maps a string value to the first rule (in rule order) whose pattern it matches.
+        """
+        if self._hs_db is not None:
+            hits = []
+            self._hs_db.scan(value.encode(), match_event_handler=lambda id_, start, end, flags, ctx: hits.append(id_))
+            return self._rules_by_pattern[self._hs_names[min(hits)]] if hits else None
+
+        if self._value_classifier is not None:
+            match = self._value_classifier.match(value)
+            if match:
+                return self._rules_by_pattern[match.lastgroup]
+
+        return None
+
+    def _matches_rule(self, key: str, rule: PIIFieldConfig) -> bool:
+        """
+        Determines if a field name matches a specific PII rule.
+        """
+        return rule._compiled_name.search(key) is not None
 
     def _apply_mask(self, value: Any, strategy: str) -> Any:
         """
@@ -130,7 +225,9 @@ class DataAnonymizer:
         val_str = str(value)
 
         if strategy == "hash":
-            return hashlib.sha256((val_str + self.salt).encode()).hexdigest()
+            ctx = self._salt_ctx.copy()
+            ctx.update(val_str.encode())
+            return ctx.hexdigest()
         
         elif strategy == "partial_mask":
             if "@" in val_str:
@@ -156,6 +253,111 @@ class DataAnonymizer:
             
         return "******"
 
+class AuditTrail:
+    """
+    In-memory ledger of access events on sensitive resources.
+    Each entry carries an HMAC-SHA256 over the trail's session_id and all of its fields,
+    keyed with AUDIT_HMAC_KEY. The key is never exported, so whoever edits a report
+    cannot recompute a matching hash; verify_entry checks them with the key.
+    """
+
+    MAX_ENTRIES = 1000
+    UUID_BATCH_SIZE = 1024
+
+    def __init__(self):
+        # Bounded deque: once full, each append drops the oldest entry in O(1)
+        self.ledger = deque(maxlen=self.MAX_ENTRIES)
+        self._rotation_logged = False
+        self._uuid_pool = deque()
+        # Per-trail prefix absorbed once into an HMAC context that each entry copies
+        self.session_id = uuid.uuid4().hex
+        self._base_mac = self._hash_prefix(self.session_id)
+
+    def _gen_uuid_batch(self):
+        """
+        Refills the event id pool from a single os.urandom call instead of one per entry.
+        """
+        raw = os.urandom(16 * self.UUID_BATCH_SIZE)
+        self._uuid_pool.extend(
+            uuid.UUID(bytes=raw[i:i + 16], version=4).hex for i in range(0, len(raw), 16)
+        )
+
+    def _next_event_id(self) -> str:
+        if not self._uuid_pool:
+            self._gen_uuid_batch()
+        return self._uuid_pool.popleft()
+
+    def log_access(self, user_id: str, action: str, resource: str, success: bool) -> Dict[str, Any]:
+        """
+        Records an access event and returns the stored entry.
+        """
+        if len(self.ledger) == self.MAX_ENTRIES and not self._rotation_logged:
+            logger.info(f"Audit ledger reached {self.MAX_ENTRIES} entries; rotating out oldest events")
+            self._rotation_logged = True
+
+        # Aware UTC datetime: naive utcnow().timestamp() would be read as local time
+        now = datetime.now(timezone.utc)
+        event_id = self._next_event_id()
+        outcome = "SUCCESS" if success else "DENIED"
+        entry = {
+            "event_id": event_id,
+            "timestamp": now.isoformat(),
+            "user_id": user_id,
+            "action": action,
+            "resource": resource,
+            "outcome": outcome,
+            "integrity_hash": self._generate_integrity_hash(
+                self._base_mac, event_id, user_id, action, resource, outcome, now.timestamp()
+            ),
+        }
+        self.ledger.append(entry)
+        return entry
+
+    @staticmethod
+    def _hash_prefix(session_id: str, key: bytes = None):
+        return hmac.new(key or AUDIT_HMAC_KEY, session_id.encode() + b":", hashlib.sha256)
+
+    @staticmethod
+    def _generate_integrity_hash(base, event_id: str, user_id: str, action: str,
+                                 resource: str, outcome: str, ts: float) -> str:
+        ctx = base.copy()
+        for part in (event_id, user_id, action, resource, outcome):
+            ctx.update(str(part).encode())
+            ctx.update(b":")
+        ctx.update(f"{ts:.6f}".encode())
+        return ctx.hexdigest()
+
+    @classmethod
+    def verify_entry(cls, session_id: str, entry: Dict[str, Any], key: bytes = None) -> bool:
+        """
+        Recomputes an exported entry's integrity hash from its fields, the report's session_id
+        and the server-side key (AUDIT_HMAC_KEY unless given).
+        """
+        ts = datetime.fromisoformat(entry["timestamp"]).timestamp()
+        expected = cls._generate_integrity_hash(
+            cls._hash_prefix(session_id, key), entry["event_id"], entry["user_id"],
+            entry["action"], entry["resource"], entry["outcome"], ts,
+        )
+        return hmac.compare_digest(expected, entry["integrity_hash"])
+
+    def export_report(self, format: str = "json") -> str:
+        """
+        Serializes the ledger for compliance review.
+        """
+        if format == "json":
+            report = {"session_id": self.session_id, "entries": list(self.ledger)}
+            return orjson.dumps(report, option=orjson.OPT_INDENT_2).decode()
+
+        if format == "csv":
+            columns = ("event_id", "timestamp", "user_id", "action", "resource", "outcome", "integrity_hash")
+            buf = io.StringIO()
+            writer = csv.writer(buf, lineterminator="\n")
+            writer.writerow(("session_id",) + columns)
+            writer.writerows((self.session_id,) + tuple(e[c] for c in columns) for e in self.ledger)
+            return buf.getvalue()
+
+        raise ValueError(f"Unsupported report format: {format}")
+
 # --- Mock Integration Test (Executes on import if desired, but kept safe) ---
 
 def _run_diagnostics():
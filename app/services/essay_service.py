@@ -1,10 +1,19 @@
 """
 Essay service for IELTS essay reading
 """
-import json
-from typing import List, Dict, Any
+import orjson
+from typing import List, Dict, Any, Optional
 from app.data.writing_corpus import get_ielts_essays
 
+# essay_number -> essay, built on first lookup (essays are static once loaded)
+_essay_index: Optional[Dict[int, Dict[str, Any]]] = None
+
+# preview_len -> brief summaries; the route bounds preview_len, so this stays small
+_brief_cache: Dict[int, List[Dict[str, Any]]] = {}
+
+# preview_len -> ready-to-send JSON body of the brief /essays response
+_brief_json_cache: Dict[int, bytes] = {}
+
 
 def get_all_essays(brief: bool = False, preview_len: int = 200) -> List[Dict[str, Any]]:
     """Get all IELTS essays. Use brief mode to avoid heavy payloads."""
@@ -12,6 +21,10 @@ def get_all_essays(brief: bool = False, preview_len: int = 200) -> List[Dict[str
     if not brief:
         return essays
 
+    cached = _brief_cache.get(preview_len)
+    if cached is not None:
+        return cached
+
     summaries: List[Dict[str, Any]] = []
     for essay in essays:
         body_text = essay.get("body_text", "")
@@ -28,15 +41,28 @@ def get_all_essays(brief: bool = False, preview_len: int = 200) -> List[Dict[str
                 "preview": preview,
             }
         )
+    _brief_cache[preview_len] = summaries
     return summaries
 
 
+def get_all_essays_brief_bytes(preview_len: int = 200) -> bytes:
+    """Serialized brief /essays payload, encoded once per preview length and served verbatim."""
+    body = _brief_json_cache.get(preview_len)
+    if body is None:
+        essays = get_all_essays(brief=True, preview_len=preview_len)
+        body = orjson.dumps({"essays": essays, "total": len(essays)})
+        _brief_json_cache[preview_len] = body
+    return body
+
+
 def get_essay_by_id(essay_id: int) -> Dict[str, Any] | None:
     """Get a specific essay by ID."""
-    essays = get_ielts_essays()
-    for essay in essays:
-        if essay.get("essay_number") == essay_id:
-            return essay
-    return None
+    global _essay_index
+    if _essay_index is None:
+        _essay_index = {}
+        for essay in get_ielts_essays():
+            # setdefault keeps the first essay for a duplicated number, as the linear scan did
+            _essay_index.setdefault(essay.get("essay_number"), essay)
+    return _essay_index.get(essay_id)
 
 
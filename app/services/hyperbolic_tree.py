@@ -9,6 +9,20 @@ import matplotlib.pyplot as plt
 # 1. Mathematical Core: Poincaré Ball Model
 # ==========================================
 
+def poincare_distance(u: torch.Tensor, v: torch.Tensor, eps: float) -> torch.Tensor:
+    """
+    Poincaré distance as a single expression, evaluated eagerly.
+    Not compiled: for the small 2-D embeddings trained here, torch.compile's one-off
+    Inductor compile costs far more than kernel fusion saves, and TorchScript is deprecated.
+    """
+    # Norms, clamped to the boundary to avoid division by zero
+    u_sq = torch.clamp(torch.sum(u * u, dim=-1), max=1 - eps)
+    v_sq = torch.clamp(torch.sum(v * v, dim=-1), max=1 - eps)
+
+    # arccosh(1 + 2 * ||u-v||^2 / ((1-||u||^2)(1-||v||^2))), gamma clamped to >= 1 + eps for stability
+    return torch.acosh(torch.clamp(1 + 2 * torch.sum((u - v) ** 2, dim=-1) / ((1 - u_sq) * (1 - v_sq)), min=1 + eps))
+
+
 class PoincareDistance(nn.Module):
     """
     Calculates the distance in the Poincaré Ball model.
@@ -20,30 +34,7 @@ class PoincareDistance(nn.Module):
         self.eps = eps
 
     def forward(self, u, v):
-        # Squared Euclidean distance
-        sq_dist = torch.sum((u - v) ** 2, dim=-1)
-
-        # Norms
-        u_sq = torch.sum(u ** 2, dim=-1)
-        v_sq = torch.sum(v ** 2, dim=-1)
-
-        # Boundary constraints to avoid division by zero
-        u_sq = torch.clamp(u_sq, max=1 - self.eps)
-        v_sq = torch.clamp(v_sq, max=1 - self.eps)
-
-        # The Mobility Factor
-        alpha = 1 - u_sq
-        beta = 1 - v_sq
-
-        # The Core Formula
-        gamma = 1 + 2 * sq_dist / (alpha * beta)
-
-        # Arccosh(x) = ln(x + sqrt(x^2 - 1))
-        # We clamp gamma to >= 1 + eps for numerical stability
-        gamma = torch.clamp(gamma, min=1 + self.eps)
-        dist = torch.acosh(gamma)
-
-        return dist
+        return poincare_distance(u, v, self.eps)
 
 
 # ==========================================
@@ -51,11 +42,12 @@ class PoincareDistance(nn.Module):
 # ==========================================
 
 class HyperbolicTreeLearner(nn.Module):
-    def __init__(self, num_nodes, embedding_dim=2):
+    def __init__(self, num_nodes, embedding_dim=2, dtype=torch.float32):
         super().__init__()
         # Initialize weights randomly near the origin (0,0)
         # In Hyperbolic space, the origin represents the "Root" of the tree.
-        self.embeddings = nn.Embedding(num_nodes, embedding_dim)
+        # float32 by default; bfloat16 is opt-in and trades Adam update precision and ball headroom for memory.
+        self.embeddings = nn.Embedding(num_nodes, embedding_dim, dtype=dtype)
 
         # Initialize with small values (close to root)
         nn.init.uniform_(self.embeddings.weight, -0.001, 0.001)
@@ -65,7 +57,8 @@ class HyperbolicTreeLearner(nn.Module):
     def forward(self, idx_u, idx_v):
         u = self.embeddings(idx_u)
         v = self.embeddings(idx_v)
-        return self.distance_fn(u, v)
+        # Distance math runs in float32 even for bfloat16 weights: 1 - eps is not representable there
+        return self.distance_fn(u.float(), v.float())
 
     def project_embeddings(self):
         """
@@ -73,11 +66,15 @@ class HyperbolicTreeLearner(nn.Module):
         We scale any vector with norm >= 1 to have norm = 1 - epsilon.
         """
         with torch.no_grad():
-            norms = torch.norm(self.embeddings.weight, p=2, dim=-1, keepdim=True)
-            max_norm = 1.0 - 1e-5
-            cond = norms > max_norm
-            projected = self.embeddings.weight / norms * max_norm
-            self.embeddings.weight.where(cond, projected)
+            weight = self.embeddings.weight
+            # Leave at least one ulp of headroom so rounding back to a low-precision dtype stays inside the ball
+            max_norm = 1.0 - max(1e-5, torch.finfo(weight.dtype).eps)
+            # Norm and scale are computed in float32, then written back in the weight's dtype
+            w = weight.float()
+            norms = torch.norm(w, p=2, dim=-1, keepdim=True).clamp(min=1e-12)
+            # Scale is 1 inside the ball, so only vectors past the boundary change.
+            # Must be in-place: Tensor.where returns a new tensor and left the weights untouched.
+            weight.copy_(w * torch.clamp(max_norm / norms, max=1.0))
 
 
 # ==========================================
@@ -123,22 +120,26 @@ neg_edges = [
 model = HyperbolicTreeLearner(num_nodes=len(node_names), embedding_dim=2)
 optimizer = optim.Adam(model.parameters(), lr=0.01)
 
+# Edge index tensors are static: build them once, positives first, then negatives,
+# so each epoch is a single forward pass that we split afterwards
+all_edges = pos_edges + neg_edges
+u_idx = torch.tensor([e[0] for e in all_edges], dtype=torch.long)
+v_idx = torch.tensor([e[1] for e in all_edges], dtype=torch.long)
+num_pos = len(pos_edges)
+
 print("Training Hyperbolic Embeddings...")
 
 for epoch in range(500):
     optimizer.zero_grad()
 
+    dists = model(u_idx, v_idx)
+    pos_dists, neg_dists = dists[:num_pos], dists[num_pos:]
+
     # 1. Positive Loss: Minimize distance between connected nodes
-    u_pos = torch.tensor([x[0] for x in pos_edges])
-    v_pos = torch.tensor([x[1] for x in pos_edges])
-    pos_dists = model(u_pos, v_pos)
     loss_pos = pos_dists.mean()  # We want this small
 
     # 2. Negative Loss: Maximize distance between unconnected nodes
     # We use a Margin Loss: max(0, margin - dist)
-    u_neg = torch.tensor([x[0] for x in neg_edges])
-    v_neg = torch.tensor([x[1] for x in neg_edges])
-    neg_dists = model(u_neg, v_neg)
     loss_neg = torch.relu(2.0 - neg_dists).mean()  # Push apart until dist is 2.0
 
     loss = loss_pos + loss_neg
@@ -161,7 +162,7 @@ print("\n--- INFERRED HIERARCHY ---")
 # Origin (0,0) = Root (Top level)
 # Boundary (norm -> 1) = Leaves (Bottom level)
 
-embeddings = model.embeddings.weight.detach().numpy()
+embeddings = model.embeddings.weight.detach().float().numpy()
 norms = np.linalg.norm(embeddings, axis=1)
 
 # Sort nodes by their distance to the center
@@ -0,0 +1,62 @@
+# app/services/llm_cache.py
+"""
+Content-addressed cache for LLM responses.
+Keys are SHA-256 digests of the normalized request, so a repeated request
+returns without an OpenAI round trip. Entries expire after a TTL and the
+cache is bounded with least-recently-used eviction.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+DEFAULT_TTL = 7 * 24 * 3600  # 7 days
+DEFAULT_MAXSIZE = 10_000
+
+
+class LLMResponseCache:
+    """
+    Thread-safe TTL + LRU cache keyed by request digests.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, ttl: float = DEFAULT_TTL):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        Digest of the request parts; callers normalize the parts before passing them in.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(repr(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+
+# Shared per-feature instances
+suggestion_cache = LLMResponseCache()
+rewrite_cache = LLMResponseCache()
@@ -1,6 +1,6 @@
 from app.services.llm_client import client, OPENAI_MODEL
 from app.data.writing_corpus import get_ielts_essays
-from app.services.text_metrics import calculate_ttr, calculate_mlu
+from app.services.text_metrics import calculate_all_metrics
 from app.models import get_db, UserProfile, PracticeHistory, init_db
 from sqlalchemy.orm import Session
 from typing import List
@@ -24,8 +24,7 @@ def _save_user_profile(user_id: int, profile_data: dict, logic_score: float, tex
     """Save user profile to database with metrics and practice history."""
     try:
         # 计算 TTR 和 MLU
-        ttr_score = calculate_ttr(text)
-        mlu_score = calculate_mlu(text)
+        ttr_score, mlu_score = calculate_all_metrics(text)
         
         # 查找或创建用户画像
         profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
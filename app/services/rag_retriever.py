@@ -1,6 +1,48 @@
 # app/services/rag_retriever.py
+import re
+from functools import lru_cache
 from app.data.writing_corpus import get_writing_corpus, get_ielts_essays
-from typing import List, Optional
+from typing import Dict, List, Optional
+
+# Enhanced keyword matching with more categories
+KEYWORDS = {
+    'technology': ['technology', 'internet', 'digital', 'online', 'ai', 'app', 'smartphone', 'computer', 'software'],
+    'environment': ['environment', 'pollution', 'climate', 'carbon', 'eco', 'green', 'biodiversity', 'species', 'extinction'],
+    'education': ['education', 'school', 'student', 'learn', 'teach', 'academic', 'university', 'degree', 'qualification'],
+    'society': ['society', 'government', 'policy', 'law', 'people', 'social', 'population', 'community', 'citizen'],
+    'health': ['health', 'medical', 'doctor', 'treatment', 'disease', 'healthcare', 'medicine'],
+    'economy': ['economy', 'economic', 'business', 'work', 'employment', 'job', 'income', 'money', 'financial'],
+    'general': ['important', 'issue', 'problem', 'solution', 'study', 'research', 'benefit', 'advantage', 'disadvantage']
+}
+
+# One compiled alternation per category: a single C-level scan answers "does any keyword occur"
+_KEYWORD_PATTERNS = {
+    category: re.compile("|".join(re.escape(w) for w in words))
+    for category, words in KEYWORDS.items()
+}
+
+_GENERAL_PATTERN = re.compile("empirical|debate|warrants|evidence|argue|conclude")
+
+# category -> corpus phrases containing one of its keywords, built once from the static corpus
+_corpus_by_category: Optional[Dict[str, List[str]]] = None
+_general_phrases: Optional[List[str]] = None
+
+
+def _matched_categories(text_lower: str) -> List[str]:
+    return [category for category, pattern in _KEYWORD_PATTERNS.items() if pattern.search(text_lower)]
+
+
+def _get_corpus_index():
+    global _corpus_by_category, _general_phrases
+    if _corpus_by_category is None:
+        corpus = get_writing_corpus()
+        lowered = [(phrase, phrase.lower()) for phrase in corpus]
+        _corpus_by_category = {
+            category: [phrase for phrase, phrase_lower in lowered if pattern.search(phrase_lower)]
+            for category, pattern in _KEYWORD_PATTERNS.items()
+        }
+        _general_phrases = [phrase for phrase, phrase_lower in lowered if _GENERAL_PATTERN.search(phrase_lower)]
+    return _corpus_by_category, _general_phrases
 
 
 def retrieve_similar_continuations(context: str, top_k: int = 3, read_essay_ids: Optional[List[int]] = None) -> list:
@@ -9,8 +51,20 @@ def retrieve_similar_continuations(context: str, top_k: int = 3, read_essay_ids:
     Retrieves similar sentence continuations from both original corpus and IELTS essays.
     If read_essay_ids is provided, prioritizes sentences from those essays.
     """
+    # 归一化后做缓存键：小写 + 合并空白不影响匹配结果；阅读记录只按集合成员判断，顺序和重复无关
+    normalized = " ".join(context.lower().split())
+    essay_ids = frozenset(read_essay_ids) if read_essay_ids else None
+    return list(_retrieve_cached(normalized, top_k, essay_ids))
+
+
+@lru_cache(maxsize=4096)
+def _retrieve_cached(context_lower: str, top_k: int, read_essay_ids: Optional[frozenset]) -> tuple:
+    return tuple(_retrieve(context_lower, top_k, read_essay_ids))
+
+
+def _retrieve(context_lower: str, top_k: int, read_essay_ids: Optional[frozenset]) -> list:
     corpus = get_writing_corpus()
-    context_lower = context.lower()
+    categories = _matched_categories(context_lower)
     
     # Extract sentences from read essays if reading history is provided
     read_essay_sentences = []
@@ -28,30 +82,19 @@ def retrieve_similar_continuations(context: str, top_k: int = 3, read_essay_ids:
                         if 8 <= len(words) <= 30:
                             read_essay_sentences.append(sentence)
     
-    # Enhanced keyword matching with more categories
-    keywords = {
-        'technology': ['technology', 'internet', 'digital', 'online', 'ai', 'app', 'smartphone', 'computer', 'software'],
-        'environment': ['environment', 'pollution', 'climate', 'carbon', 'eco', 'green', 'biodiversity', 'species', 'extinction'],
-        'education': ['education', 'school', 'student', 'learn', 'teach', 'academic', 'university', 'degree', 'qualification'],
-        'society': ['society', 'government', 'policy', 'law', 'people', 'social', 'population', 'community', 'citizen'],
-        'health': ['health', 'medical', 'doctor', 'treatment', 'disease', 'healthcare', 'medicine'],
-        'economy': ['economy', 'economic', 'business', 'work', 'employment', 'job', 'income', 'money', 'financial'],
-        'general': ['important', 'issue', 'problem', 'solution', 'study', 'research', 'benefit', 'advantage', 'disadvantage']
-    }
-
     matched = []
     
     # Priority pass: if user has reading history, prioritize sentences from read essays
     if read_essay_sentences:
-        for category, words in keywords.items():
-            if any(w in context_lower for w in words):
-                for sentence in read_essay_sentences:
-                    sentence_lower = sentence.lower()
-                    if any(kw in sentence_lower for kw in words):
-                        if sentence not in matched:
-                            matched.append(sentence)
-                        if len(matched) >= top_k:
-                            return matched[:top_k]
+        lowered_sentences = [(sentence, sentence.lower()) for sentence in read_essay_sentences]
+        for category in categories:
+            pattern = _KEYWORD_PATTERNS[category]
+            for sentence, sentence_lower in lowered_sentences:
+                if pattern.search(sentence_lower):
+                    if sentence not in matched:
+                        matched.append(sentence)
+                    if len(matched) >= top_k:
+                        return matched[:top_k]
         
         # Second priority: word overlap with read essays
         if len(matched) < top_k:
@@ -73,16 +116,15 @@ def retrieve_similar_continuations(context: str, top_k: int = 3, read_essay_ids:
     
     # Fallback to original corpus if not enough matches from read essays
     if len(matched) < top_k:
+        corpus_by_category, general_phrases = _get_corpus_index()
+
         # First pass: exact keyword matching from corpus
-        for category, words in keywords.items():
-            if any(w in context_lower for w in words):
-                for phrase in corpus:
-                    phrase_lower = phrase.lower()
-                    if any(kw in phrase_lower for kw in words):
-                        if phrase not in matched:
-                            matched.append(phrase)
-                        if len(matched) >= top_k:
-                            return matched[:top_k]
+        for category in categories:
+            for phrase in corpus_by_category[category]:
+                if phrase not in matched:
+                    matched.append(phrase)
+                if len(matched) >= top_k:
+                    return matched[:top_k]
 
         # Second pass: semantic similarity (simple word overlap) from corpus
         if len(matched) < top_k:
@@ -106,7 +148,6 @@ def retrieve_similar_continuations(context: str, top_k: int = 3, read_essay_ids:
 
         # Fallback: return general academic phrases
         if len(matched) < top_k:
-            general_phrases = [p for p in corpus if any(word in p.lower() for word in ['empirical', 'debate', 'warrants', 'evidence', 'argue', 'conclude'])]
             for phrase in general_phrases:
                 if phrase not in matched:
                     matched.append(phrase)
@@ -1,4 +1,5 @@
 import time
+import heapq
 import threading
 from typing import Dict, Tuple, Optional
 import logging
@@ -10,53 +11,112 @@ class TokenBucket:
     Thread-safe implementation of the Token Bucket algorithm for API rate limiting.
     Used to control traffic spikes and ensure system stability.
     """
+
+    SCALE = 1_000_000  # tokens are tracked as integer micro-tokens
     
     def __init__(self, capacity: int, refill_rate: float):
         """
         :param capacity: Maximum number of tokens in the bucket
         :param refill_rate: Tokens added per second
         """
-        self._capacity = float(capacity)
-        self._tokens = float(capacity)
-        self._refill_rate = refill_rate
-        self._last_refill = time.time()
+        self._capacity = int(capacity * self.SCALE)
+        self._refill_rate = int(refill_rate * self.SCALE)  # micro-tokens per second
+        # Smallest gap that earns at least one micro-token; shorter gaps would add nothing
+        self._min_refill_ns = -(-1_000_000_000 // self._refill_rate) if self._refill_rate > 0 else 0
+        # (last_refill_ns, micro_tokens), always replaced as a whole so readers see a consistent pair
+        self._state: Tuple[int, int] = (time.monotonic_ns(), self._capacity)
         self._lock = threading.Lock()
 
+    @property
+    def last_refill_ns(self) -> int:
+        return self._state[0]
+
     def consume(self, tokens: int = 1) -> bool:
         """
         Attempt to consume tokens. Returns True if successful, False otherwise.
         """
+        cost = tokens * self.SCALE
         with self._lock:
-            self._refill()
-            if self._tokens >= tokens:
-                self._tokens -= tokens
+            last_refill, available = self._refill(self._state, time.monotonic_ns())
+            if available >= cost:
+                self._state = (last_refill, available - cost)
                 return True
+            self._state = (last_refill, available)
             return False
 
-    def _refill(self):
-        now = time.time()
-        delta = now - self._last_refill
-        tokens_to_add = delta * self._refill_rate
-        self._tokens = min(self._capacity, self._tokens + tokens_to_add)
-        self._last_refill = now
+    def _refill(self, state: Tuple[int, int], now: int) -> Tuple[int, int]:
+        """
+        Pure refill step: returns the new (last_refill_ns, micro_tokens) for time `now`.
+        """
+        last_refill, available = state
+        if available >= self._capacity:
+            return now, available
+        elapsed = now - last_refill
+        if elapsed < self._min_refill_ns:
+            # tokens_to_add would be 0; keep last_refill so the elapsed time still counts next call
+            return state
+        tokens_to_add = elapsed * self._refill_rate // 1_000_000_000
+        return now, min(self._capacity, available + tokens_to_add)
 
 class APIRateLimiter:
     """
     Manager class to handle rate limits for different IP addresses or User IDs.
     """
+
+    NUM_STRIPES = 64  # power of two, so a stripe is picked with a mask
     
-    def __init__(self):
+    def __init__(self, max_buckets: int = 100_000, ttl: int = 3600, sweep_interval: int = 60):
         self._buckets: Dict[str, TokenBucket] = {}
         self._default_limit = (60, 1.0) # 60 reqs burst, 1 req/sec refill
         self._vip_limit = (200, 5.0)    # 200 reqs burst, 5 req/sec refill
-        self._lock = threading.Lock()
+        # Striped locks only guard bucket creation; lookups of existing buckets take no lock
+        self._stripes = [threading.Lock() for _ in range(self.NUM_STRIPES)]
+        # Housekeeping runs on the creation path, so the table stays bounded without an external caller
+        self._max_buckets = max_buckets
+        self._ttl = ttl
+        self._sweep_interval_ns = int(sweep_interval * 1_000_000_000)
+        self._last_sweep_ns = time.monotonic_ns()
+        self._sweep_lock = threading.Lock()
 
     def get_bucket(self, key: str, is_vip: bool = False) -> TokenBucket:
-        with self._lock:
-            if key not in self._buckets:
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            return bucket
+
+        self._maybe_sweep()
+
+        # A key always maps to the same stripe, so re-checking under it prevents duplicate buckets
+        with self._stripes[hash(key) & (self.NUM_STRIPES - 1)]:
+            bucket = self._buckets.get(key)
+            if bucket is None:
                 capacity, rate = self._vip_limit if is_vip else self._default_limit
-                self._buckets[key] = TokenBucket(capacity, rate)
-            return self._buckets[key]
+                bucket = self._buckets.setdefault(key, TokenBucket(capacity, rate))
+            return bucket
+
+    def _maybe_sweep(self):
+        """
+        Drop idle buckets once per sweep interval, or immediately when the table is full.
+        Only one thread sweeps at a time; the others skip it rather than wait.
+        """
+        now = time.monotonic_ns()
+        full = len(self._buckets) >= self._max_buckets
+        if not full and now - self._last_sweep_ns < self._sweep_interval_ns:
+            return
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep_ns = now
+            self.cleanup_stale_buckets(self._ttl)
+            overflow = len(self._buckets) - self._max_buckets + 1
+            if overflow > 0:
+                # Everything is still active: evict the least recently used buckets (plus 10% headroom)
+                count = overflow + self._max_buckets // 10
+                items = list(self._buckets.items())
+                for key, _ in heapq.nsmallest(count, items, key=lambda item: item[1].last_refill_ns):
+                    self._buckets.pop(key, None)
+                logger.info(f"Rate limit table full, evicted {min(count, len(items))} least recently used buckets")
+        finally:
+            self._sweep_lock.release()
 
     def allow_request(self, client_id: str, is_vip: bool = False) -> bool:
         """
@@ -73,19 +133,21 @@ class APIRateLimiter:
     def cleanup_stale_buckets(self, ttl: int = 3600):
         """
         Remove buckets that haven't been accessed in TTL seconds to free memory.
+        Called automatically from get_bucket; can still be invoked directly.
         """
-        with self._lock:
-            current_time = time.time()
-            keys_to_remove = []
-            for key, bucket in self._buckets.items():
-                if current_time - bucket._last_refill > ttl:
-                    keys_to_remove.append(key)
-            
-            for key in keys_to_remove:
-                del self._buckets[key]
-            
-            if keys_to_remove:
-                logger.info(f"Cleaned up {len(keys_to_remove)} stale rate limit buckets")
+        current_time = time.monotonic_ns()
+        ttl_ns = int(ttl * 1_000_000_000)
+        # Snapshot the items so the sweep never holds a lock over the whole table
+        keys_to_remove = [
+            key for key, bucket in list(self._buckets.items())
+            if current_time - bucket.last_refill_ns > ttl_ns
+        ]
+
+        for key in keys_to_remove:
+            self._buckets.pop(key, None)
+
+        if keys_to_remove:
+            logger.info(f"Cleaned up {len(keys_to_remove)} stale rate limit buckets")
 
 # Global instance
 limiter = APIRateLimiter()
\ No newline at end of file
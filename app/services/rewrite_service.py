@@ -1,28 +1,78 @@
-from app.services.llm_client import client, OPENAI_MODEL
-import json
+import logging
+from app.services.llm_client import aclient, OPENAI_MODEL
+from app.services.llm_cache import rewrite_cache
 
-def rewrite_sentence(sentence: str) -> str:
-    """
-    Rewrite a sentence using OpenAI API to improve English expression.
-    """
+logger = logging.getLogger(__name__)
+
+
+def _build_messages(sentence: str) -> list:
     prompt = f"Rewrite this sentence in better English: {sentence}"
 
-    messages = [
+    return [
         {"role": "system", "content": "You are a helpful assistant."},
         {"role": "user", "content": prompt}
     ]
 
+
+def _build_response(sentence: str, cache_key: str, content: str) -> dict:
+    rewritten_text = content.strip()
+    if rewritten_text:
+        rewrite_cache.set(cache_key, rewritten_text)
+
+    return {
+        "original": sentence,
+        "rewritten": rewritten_text
+    }
+
+
+async def rewrite_sentence(sentence: str) -> dict:
+    """
+    Rewrite a sentence using OpenAI API to improve English expression.
+    Awaits the OpenAI call instead of blocking a worker.
+    """
+    cache_key = rewrite_cache.make_key(sentence.strip())
+    cached = rewrite_cache.get(cache_key)
+    if cached is not None:
+        return {"original": sentence, "rewritten": cached}
+
     try:
-        completion = client.chat.completions.create(model=OPENAI_MODEL, messages=messages)
-        rewritten_text = completion.choices[0].message.content.strip()
+        completion = await aclient.chat.completions.create(model=OPENAI_MODEL, messages=_build_messages(sentence))
+        return _build_response(sentence, cache_key, completion.choices[0].message.content)
 
-        response = {
-            "original": sentence,
-            "rewritten": rewritten_text
-        }
+    except Exception as e:
+        logger.error(f"Error generating rewritten sentence: {e}")
+        return {"error": str(e)}
 
-        return json.dumps(response)
 
+async def stream_rewrite_sentence(sentence: str):
+    """
+    Streaming variant of rewrite_sentence: yields text fragments as the model produces them,
+    so the client sees the first words without waiting for the full completion.
+    """
+    cache_key = rewrite_cache.make_key(sentence.strip())
+    cached = rewrite_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    try:
+        stream = await aclient.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=_build_messages(sentence),
+            stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            fragment = chunk.choices[0].delta.content
+            if fragment:
+                parts.append(fragment)
+                yield fragment
     except Exception as e:
-        print(f"Error generating rewritten sentence: {e}")
-        return json.dumps({"error": str(e)})
+        logger.error(f"Error streaming rewritten sentence: {e}")
+        raise  # the endpoint reports it to the client as an error event
+
+    rewritten_text = "".join(parts).strip()
+    if rewritten_text:
+        rewrite_cache.set(cache_key, rewritten_text)
@@ -1,83 +1,320 @@
 # app/services/suggest_service.py
-import json
+import os
 import re
-from app.services.llm_client import client, OPENAI_MODEL
+import asyncio
+import logging
+import orjson
+from pydantic import BaseModel, Field, ValidationError
+from app.services.llm_client import aclient, OPENAI_MODEL
 from app.services.rag_retriever import retrieve_similar_continuations
+from app.services.llm_cache import suggestion_cache
+from app.services.batch_queue import MicroBatcher
 
+logger = logging.getLogger(__name__)
 
-def generate_suggestions(text: str, cursor: dict, read_essay_ids: list = None) -> str:
-    """
-    Generate 3 high-quality, academically appropriate ENGLISH PHRASES 
-    that can naturally follow the user's current text.
+# Extra attempts after the first one when the output fails parsing or schema validation
+MAX_RETRIES = 2
 
-    - Input: full text (we use last ~100 chars as context)
-    - Output: 3 phrases (2-8 words), with explanations, in JSON
+# 合并多个用户的请求到一次调用（默认关闭）：共享 prompt 会让一个用户的文本影响他人的建议
+SUGGESTION_BATCHING = os.getenv("SUGGESTION_BATCHING", "false").lower() == "true"
+
+
+class Suggestion(BaseModel):
+    text: str
+    explain: str = ""
+
+
+class Suggestions(BaseModel):
+    suggestions: list[Suggestion] = Field(min_length=1)
+
+# Byte-identical on every call so the provider's prompt prefix cache can reuse it;
+# all per-request content (context, retrieved examples) goes in the user message.
+SUGGESTION_SYSTEM_PROMPT = """You are an IELTS writing coach. The student is composing an academic English essay.
+
+The user message contains the text the student has written so far. They are about to continue writing.
+Your task is to suggest EXACTLY 3 natural, advanced, and exam-appropriate ENGLISH PHRASES
+that can LOGICALLY and GRAMMATICALLY FOLLOW this text — as if the student is continuing their sentence.
+
+CRITICAL RULES:
+1. Each phrase must be 2 to 8 words long.
+2. Use formal, academic vocabulary (Band 7+ or CET-6 level).
+3. NEVER use: "and", "but", "so", "I think", "very", "good", "bad", "help", "make", "thing", "stuff".
+4. MUST be grammatically compatible with the current sentence structure.
+   - If the current sentence ends with a noun (like "air pollution"), the suggestion should start with a verb or relative clause.
+   - Example: "which significantly harms public health" OR "that exacerbates climate change"
+5. Avoid standalone sentences — only provide continuations that complete the existing thought.
+6. If possible, echo the style of the real examples given after the student's text.
+
+Return a STRICT JSON object with this structure:
+{
+  "suggestions": [
+    {
+      "text": "exact phrase here",
+      "explain": "1-sentence teaching note: why this phrase is strong AND grammatically correct in context"
+    },
+    ...
+  ]
+}
+DO NOT add any other text, markdown, or explanation outside the JSON."""
+
+# Used when several requests are coalesced into one call; the rules above still apply to each item.
+# Note: batching puts several users' text into one prompt, so one user's text can try to
+# steer (prompt-inject) the suggestions returned to the others in the same batch.
+SUGGESTION_BATCH_SYSTEM_PROMPT = SUGGESTION_SYSTEM_PROMPT + """
+
+BATCH MODE: the user message is a JSON array of independent requests, each {"id": <int>, "request": <text>}.
+Treat every request separately, exactly as if it were the only user message, and instead of the structure above return:
+{
+  "results": [
+    {"id": <int>, "suggestions": [ ...3 items as above... ]},
+    ...
+  ]
+}
+with exactly one entry per id."""
+
+
+def _build_request(text: str, read_essay_ids: list = None):
+    """
+    Shared preparation for the batched and streaming paths.
+    Returns (cached_result, cache_key, messages); cached_result is set when no LLM call is needed.
     """
     if not text.strip():
-        return json.dumps({"suggestions": []})
+        return {"suggestions": []}, None, None
 
     # Use last 100 characters as context to avoid token overflow
     context = text[-100:].strip()
 
+    # Identical context + reading history -> reuse the earlier response, no LLM round trip
+    cache_key = suggestion_cache.make_key(context, tuple(sorted(set(read_essay_ids or ()))))
+    cached = suggestion_cache.get(cache_key)
+    if cached is not None:
+        return cached, cache_key, None
+
     # Retrieve relevant examples based on reading history for RAG enhancement
     retrieved_examples = retrieve_similar_continuations(context, top_k=3, read_essay_ids=read_essay_ids)
 
-    # Build strong-constraint prompt
-    prompt = f"""
-    You are an IELTS writing coach. The student is composing an academic English essay.
-
-    Current text they have written:
-    "{context}"
-
-    They are about to continue writing. Your task is to suggest EXACTLY 3 natural, advanced, and exam-appropriate ENGLISH PHRASES 
-    that can LOGICALLY and GRAMMATICALLY FOLLOW this text — as if the student is continuing their sentence.
-
-    CRITICAL RULES:
-    1. Each phrase must be 2 to 8 words long.
-    2. Use formal, academic vocabulary (Band 7+ or CET-6 level).
-    3. NEVER use: "and", "but", "so", "I think", "very", "good", "bad", "help", "make", "thing", "stuff".
-    4. MUST be grammatically compatible with the current sentence structure.
-       - If the current sentence ends with a noun (like "air pollution"), the suggestion should start with a verb or relative clause.
-       - Example: "which significantly harms public health" OR "that exacerbates climate change"
-    5. Avoid standalone sentences — only provide continuations that complete the existing thought.
-    6. If possible, echo the style of these real examples:
-    {chr(10).join([f' - "{ex}"' for ex in retrieved_examples])}
-
-    Return a STRICT JSON object with this structure:
-    {{
-      "suggestions": [
-        {{
-          "text": "exact phrase here",
-          "explain": "1-sentence teaching note: why this phrase is strong AND grammatically correct in context"
-        }},
-        ...
-      ]
-    }}
-    DO NOT add any other text, markdown, or explanation outside the JSON.
+    # Static rules go in the system message; only this short message changes per request
+    examples = "\n".join(f' - "{ex}"' for ex in retrieved_examples)
+    user_message = f'Current text they have written:\n"{context}"\n\nReal examples to echo:\n{examples}'
+    messages = [
+        {"role": "system", "content": SUGGESTION_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message},
+    ]
+    return None, cache_key, messages
+
+
+def _parse_suggestions(content: str) -> dict:
+    """
+    Parse and schema-check one completion. Raises ValueError / ValidationError on bad output.
     """
+    result = (content or "").strip()
+    if not result:
+        raise ValueError("Empty LLM response")
+
     try:
-        completion = client.chat.completions.create(
+        parsed = orjson.loads(result)
+    except orjson.JSONDecodeError:
+        # Some models may wrap JSON in extra text; try to extract the JSON object.
+        match = re.search(r"\{.*\}", result, re.DOTALL)
+        if not match:
+            raise
+        parsed = orjson.loads(match.group(0))
+
+    return Suggestions.model_validate(parsed).model_dump()
+
+
+def _with_feedback(messages: list, content: str, error: Exception) -> list:
+    """Append the rejected output and the validator's error so the model can correct itself."""
+    return messages + [
+        {"role": "assistant", "content": content or ""},
+        {"role": "user", "content": f"Your output had error: {error}. Return valid JSON matching the schema."},
+    ]
+
+
+async def _complete_single(cache_key: str, messages: list) -> dict:
+    for attempt in range(MAX_RETRIES + 1):
+        completion = await aclient.chat.completions.create(
             model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
+            messages=messages,
             response_format={"type": "json_object"},  # Enforce JSON
             max_completion_tokens=2000
         )
-        result = completion.choices[0].message.content or ""
-        result = result.strip()
-        if not result:
-            raise ValueError("Empty LLM response")
-
+        content = completion.choices[0].message.content
         try:
-            parsed = json.loads(result)
-        except json.JSONDecodeError:
-            # Some models may wrap JSON in extra text; try to extract the JSON object.
-            match = re.search(r"\{.*\}", result, re.DOTALL)
-            if not match:
+            result = _parse_suggestions(content)
+        except (ValueError, ValidationError) as e:
+            if attempt == MAX_RETRIES:
                 raise
-            parsed = json.loads(match.group(0))
+            logger.warning(f"Invalid suggestion output (attempt {attempt + 1}), retrying: {e}")
+            messages = _with_feedback(messages, content, e)
+            await asyncio.sleep(1.0 * (attempt + 1))
+            continue
+        suggestion_cache.set(cache_key, result)
+        return result
+
+
+async def _complete_suggestion_batch(items: list) -> list:
+    """
+    Batch handler for the micro-batcher: items are (cache_key, messages) pairs.
+    Several pending requests share one completion; ids map each result back to its caller.
+    """
+    if len(items) == 1:
+        return [await _complete_single(*items[0])]
 
-        return json.dumps(parsed, ensure_ascii=False)
+    requests = [{"id": i, "request": messages[-1]["content"]} for i, (_, messages) in enumerate(items)]
+    by_id = {}
+    try:
+        completion = await aclient.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": SUGGESTION_BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": orjson.dumps(requests).decode()},
+            ],
+            response_format={"type": "json_object"},  # Enforce JSON
+            max_completion_tokens=2000 * len(items)
+        )
+        parsed = orjson.loads((completion.choices[0].message.content or "").strip())
+        for entry in parsed.get("results", []):
+            try:
+                entry_id = entry["id"]
+                if isinstance(entry_id, int) and 0 <= entry_id < len(items):
+                    by_id[entry_id] = Suggestions.model_validate(entry).model_dump()
+            except (KeyError, TypeError, ValidationError):
+                continue
+    except Exception as e:
+        # API errors (rate limit, context length, network) and unparseable output alike
+        logger.warning(f"Batch completion failed, retrying items individually: {e}")
+
+    for i, result in by_id.items():
+        suggestion_cache.set(items[i][0], result)
+
+    # Entries the model skipped or mangled (or the whole batch, if the call failed) get dedicated calls
+    missing = [i for i in range(len(items)) if i not in by_id]
+    retried = await asyncio.gather(
+        *(_complete_single(*items[i]) for i in missing), return_exceptions=True
+    )
+    for i, result in zip(missing, retried):
+        if isinstance(result, Exception):
+            logger.error(f"Suggestion generation error: {result}")
+            result = {"suggestions": []}
+        by_id[i] = result
+    return [by_id[i] for i in range(len(items))]
+
+
+suggestion_batcher = MicroBatcher(_complete_suggestion_batch)
+
+
+async def generate_suggestions(text: str, cursor: dict, read_essay_ids: list = None) -> dict:
+    """
+    Generate 3 high-quality, academically appropriate ENGLISH PHRASES 
+    that can naturally follow the user's current text.
+
+    - Input: full text (we use last ~100 chars as context)
+    - Output: {"suggestions": [...]} with 3 phrases (2-8 words) and explanations
+
+    The OpenAI round trip is awaited, so the event loop keeps serving other requests
+    while the model runs. With SUGGESTION_BATCHING on, cache misses go through the
+    micro-batcher so concurrent users share one LLM call.
+    """
+    cached, cache_key, messages = _build_request(text, read_essay_ids)
+    if cached is not None:
+        return cached
+
+    try:
+        if SUGGESTION_BATCHING:
+            return await suggestion_batcher.submit((cache_key, messages))
+        return await _complete_single(cache_key, messages)
     except Exception as e:
-        print(f"Suggestion generation error: {e}")
+        logger.error(f"Suggestion generation error: {e}")
         # Fallback: return safe empty response
-        return json.dumps({"suggestions": []})
+        return {"suggestions": []}
+
+
+class _SuggestionStreamParser:
+    """
+    Incremental scanner over the streamed JSON body.
+    Tracks string/escape state and brace depth, and returns each object
+    inside the "suggestions" array as soon as its closing brace arrives.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._start = None
+        self._pos = 0
+        self._text = ""
+
+    def feed(self, fragment: str) -> list:
+        self._text += fragment
+        ready = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+                # depth 1 = root object, depth 2 = one suggestion inside the array
+                if self._depth == 2:
+                    self._start = i
+            elif ch == "}":
+                if self._depth == 2 and self._start is not None:
+                    try:
+                        ready.append(orjson.loads(text[self._start:i + 1]))
+                    except orjson.JSONDecodeError:
+                        pass
+                    self._start = None
+                self._depth -= 1
+        self._pos = len(text)
+        return ready
+
+
+async def stream_suggestions(text: str, cursor: dict, read_essay_ids: list = None):
+    """
+    Streaming variant: yields each suggestion dict as soon as the model closes it,
+    instead of waiting for the whole completion. The full result is still cached.
+    """
+    cached, cache_key, messages = _build_request(text, read_essay_ids)
+    if cached is not None:
+        for suggestion in cached.get("suggestions", []):
+            yield suggestion
+        return
+
+    parser = _SuggestionStreamParser()
+    suggestions = []
+    try:
+        stream = await aclient.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            response_format={"type": "json_object"},  # Enforce JSON
+            max_completion_tokens=2000,
+            stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            fragment = chunk.choices[0].delta.content
+            if not fragment:
+                continue
+            for candidate in parser.feed(fragment):
+                try:
+                    suggestion = Suggestion.model_validate(candidate).model_dump()
+                except ValidationError:
+                    continue
+                suggestions.append(suggestion)
+                yield suggestion
+    except Exception as e:
+        logger.error(f"Suggestion streaming error: {e}")
+        raise  # the endpoint reports it to the client as an error event
+
+    if suggestions:
+        suggestion_cache.set(cache_key, {"suggestions": suggestions})
@@ -1 +1 @@
-uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
\ No newline at end of file
+uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 --loop auto --ws-per-message-deflate false
\ No newline at end of file
@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+
+from app.services.rate_limiter import TokenBucket
+
+SECOND = 1_000_000_000
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def _bucket_at(self, now, capacity, refill_rate):
+        with mock.patch("app.services.rate_limiter.time.monotonic_ns", return_value=now):
+            return TokenBucket(capacity, refill_rate)
+
+    def _consume_at(self, bucket, now):
+        with mock.patch("app.services.rate_limiter.time.monotonic_ns", return_value=now):
+            return bucket.consume(1)
+
+    def test_fractional_balance_is_refilled(self):
+        start = 10 * SECOND
+        bucket = self._bucket_at(start, capacity=5, refill_rate=1.0)
+        # Drain the bucket completely at t
+        for _ in range(5):
+            self.assertTrue(self._consume_at(bucket, start))
+        self.assertFalse(self._consume_at(bucket, start))
+
+        # t+1.5s: balance 1.5 -> consume leaves 0.5
+        self.assertTrue(self._consume_at(bucket, start + 3 * SECOND // 2))
+        # t+2.2s: balance 1.2, so this must be allowed
+        self.assertTrue(self._consume_at(bucket, start + 22 * SECOND // 10))
+        # Balance is now 0.2
+        self.assertFalse(self._consume_at(bucket, start + 22 * SECOND // 10))
+
+    def test_sub_micro_token_gaps_still_accumulate(self):
+        start = 10 * SECOND
+        bucket = self._bucket_at(start, capacity=1, refill_rate=1.0)
+        self.assertTrue(self._consume_at(bucket, start))
+        # Many calls spaced below the one-micro-token threshold must not lose elapsed time
+        now = start
+        for _ in range(2000):
+            now += 500
+            self._consume_at(bucket, now)
+        self.assertTrue(self._consume_at(bucket, start + SECOND))
+
+
+if __name__ == "__main__":
+    unittest.main()
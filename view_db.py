@@ -2,41 +2,53 @@
 """
 查看数据库数据的脚本
 """
-from app.models import init_db, get_db, User
-from sqlalchemy.orm import Session
+from app.models import init_db, SessionLocal, User
+from sqlalchemy import select, func
 from datetime import datetime
 
+# 每批从服务端游标读取的行数
+USER_BATCH_SIZE = 1000
+
 def view_database():
     """查看数据库中的所有数据"""
     init_db()
-    db = next(get_db())
-    
+    with SessionLocal() as db:
+        _print_database(db)
+
+def _print_database(db):
     print("=" * 60)
     print("WriteLoop 数据库数据查看")
     print("=" * 60)
     print()
     
-    # 查看用户数据
-    users = db.query(User).all()
-    print(f"📊 用户总数: {len(users)}")
+    # 查看用户数据：总数单独 COUNT，明细分批流式读取，内存占用与表大小无关
+    total = db.scalar(select(func.count(User.id)))
+    print(f"📊 用户总数: {total}")
     print()
     
-    if users:
+    if total:
+        # 只查询展示用到的列，密码哈希在 MySQL 端截断后再传输
+        users = db.execute(
+            select(
+                User.id,
+                User.username,
+                User.created_at,
+                func.substr(User.hashed_password, 1, 30).label("password_prefix"),
+            ).execution_options(yield_per=USER_BATCH_SIZE)
+        )
         print("👥 用户列表:")
         print("-" * 60)
         for user in users:
             print(f"  ID: {user.id}")
             print(f"  用户名: {user.username}")
             print(f"  创建时间: {user.created_at}")
-            print(f"  密码哈希: {user.hashed_password[:30]}...")
+            print(f"  密码哈希: {user.password_prefix}...")
             print("-" * 60)
     else:
         print("  暂无用户数据")
     
     print()
     print("=" * 60)
-    
-    db.close()
 
 if __name__ == "__main__":
     view_database()
@@ -2,34 +2,33 @@
 """
 高级数据库查看脚本 - 可以查看更详细的信息
 """
-from app.models import init_db, get_db, User
+from app.models import init_db, SessionLocal, User
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import select, func, text
 import sys
 
-def view_users():
+# 每批从服务端游标读取的行数
+USER_BATCH_SIZE = 1000
+
+def view_users(db: Session):
     """查看所有用户"""
-    init_db()
-    db = next(get_db())
-    
-    users = db.query(User).all()
-    print(f"\n📊 用户总数: {len(users)}\n")
+    # 总数单独 COUNT；明细只查询展示用到的列，并分批流式读取
+    total = db.scalar(select(func.count(User.id)))
+    print(f"\n📊 用户总数: {total}\n")
     
-    if users:
+    if total:
+        users = db.execute(
+            select(User.id, User.username, User.created_at).execution_options(yield_per=USER_BATCH_SIZE)
+        )
         print(f"{'ID':<5} {'用户名':<20} {'创建时间':<20}")
         print("-" * 50)
         for user in users:
             print(f"{user.id:<5} {user.username:<20} {str(user.created_at):<20}")
     else:
         print("  暂无用户数据")
-    
-    db.close()
 
-def view_user_detail(username=None):
+def view_user_detail(db: Session, username=None):
     """查看特定用户的详细信息"""
-    init_db()
-    db = next(get_db())
-    
     if username:
         user = db.query(User).filter(User.username == username).first()
         if user:
@@ -43,44 +42,46 @@ def view_user_detail(username=None):
             print(f"❌ 未找到用户: {username}")
     else:
         print("请提供用户名，例如: python3 view_db_advanced.py detail Jialu")
-    
-    db.close()
 
-def view_table_info():
+def view_table_info(db: Session):
     """查看表结构信息"""
-    init_db()
-    db = next(get_db())
-    
-    result = db.execute(text("SHOW TABLES"))
-    tables = result.fetchall()
+    # 一次查询取回所有表的列信息，在本地按表分组（代替 SHOW TABLES + DESCRIBE 两次往返）
+    result = db.execute(text(
+        "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE "
+        "FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() "
+        "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+    ))
+    tables = {}
+    for table_name, column_name, column_type, is_nullable in result:
+        tables.setdefault(table_name, []).append((column_name, column_type, is_nullable))
     
     print("\n📋 数据库表列表:")
     print("-" * 50)
-    for table in tables:
-        print(f"  - {table[0]}")
+    for table_name in tables:
+        print(f"  - {table_name}")
     
-    # 查看 users 表结构
-    print("\n📋 users 表结构:")
-    print("-" * 50)
-    result = db.execute(text("DESCRIBE users"))
-    columns = result.fetchall()
-    for col in columns:
-        print(f"  {col[0]:<20} {col[1]:<20} {col[2]}")
-    
-    db.close()
+    # 查看各表结构
+    for table_name, columns in tables.items():
+        print(f"\n📋 {table_name} 表结构:")
+        print("-" * 50)
+        for column_name, column_type, is_nullable in columns:
+            print(f"  {column_name:<20} {column_type:<20} {is_nullable}")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
-        if command == "detail" and len(sys.argv) > 2:
-            view_user_detail(sys.argv[2])
-        elif command == "tables":
-            view_table_info()
-        else:
-            print("用法:")
-            print("  python3 view_db_advanced.py          # 查看所有用户")
-            print("  python3 view_db_advanced.py detail <用户名>  # 查看特定用户详情")
-            print("  python3 view_db_advanced.py tables    # 查看表结构")
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command in (None, "tables") or (command == "detail" and len(sys.argv) > 2):
+        # 只初始化一次，整个命令复用同一个会话
+        init_db()
+        with SessionLocal() as db:
+            if command is None:
+                view_users(db)
+            elif command == "tables":
+                view_table_info(db)
+            else:
+                view_user_detail(db, sys.argv[2])
     else:
-        view_users()
-
+        print("用法:")
+        print("  python3 view_db_advanced.py          # 查看所有用户")
+        print("  python3 view_db_advanced.py detail <用户名>  # 查看特定用户详情")
+        print("  python3 view_db_advanced.py tables    # 查看表结构")